@@ -8,14 +8,24 @@
 
 """Downloader module for http:// and https:// URLs"""
 
+import os
 import time
+import errno
+import random
+import select
+import shutil
+import socket
+import tempfile
+import threading
 import mimetypes
-from requests.exceptions import RequestException, ConnectionError, Timeout
+import concurrent.futures
+from requests.exceptions import (
+    RequestException, ConnectionError, Timeout, ReadTimeout, HTTPError)
+from requests.packages.urllib3.exceptions import HTTPError as Urllib3Error
 from .common import DownloaderBase
 from .. import text, util
 
-from email.utils import parsedate_tz
-from datetime import datetime
+from email.utils import parsedate_to_datetime
 from ssl import SSLError
 try:
     from OpenSSL.SSL import Error as OpenSSLError
@@ -33,6 +43,9 @@ class HttpDownloader(DownloaderBase):
 
         self.adjust_extension = self.config("adjust-extensions", True)
         self.chunk_size = self.config("chunk-size", 32768)
+        self.buffer_size = self.config("write-buffer-size", 1048576)
+        self.connections = self.config("connections", 1)
+        self.splice = self.config("splice", False) and hasattr(os, "splice")
         self.metadata = extractor.config("http-metadata")
         self.progress = self.config("progress", 3.0)
         self.headers = self.config("headers")
@@ -44,34 +57,53 @@ class HttpDownloader(DownloaderBase):
         self.mtime = self.config("mtime", True)
         self.rate = self.config("rate")
 
+        self._headers = {"Accept": "*/*"}
+        if self.headers:
+            self._headers.update(self.headers)
+
         if self.retries < 0:
             self.retries = float("inf")
         if self.minsize:
-            minsize = text.parse_bytes(self.minsize)
+            minsize = _parse_bytes(self.minsize)
             if not minsize:
                 self.log.warning(
                     "Invalid minimum file size (%r)", self.minsize)
             self.minsize = minsize
         if self.maxsize:
-            maxsize = text.parse_bytes(self.maxsize)
+            maxsize = _parse_bytes(self.maxsize)
             if not maxsize:
                 self.log.warning(
                     "Invalid maximum file size (%r)", self.maxsize)
             self.maxsize = maxsize
-        if isinstance(self.chunk_size, str):
-            chunk_size = text.parse_bytes(self.chunk_size)
+        self.chunk_auto = (self.chunk_size == "auto")
+        if self.chunk_auto:
+            self.chunk_size = 32768
+        elif isinstance(self.chunk_size, str):
+            chunk_size = _parse_bytes(self.chunk_size)
             if not chunk_size:
                 self.log.warning(
                     "Invalid chunk size (%r)", self.chunk_size)
                 chunk_size = 32768
             self.chunk_size = chunk_size
+        if isinstance(self.buffer_size, str):
+            buffer_size = _parse_bytes(self.buffer_size)
+            if not buffer_size:
+                self.log.warning(
+                    "Invalid write buffer size (%r)", self.buffer_size)
+                buffer_size = 1048576
+            self.buffer_size = buffer_size
         if self.rate:
-            rate = text.parse_bytes(self.rate)
+            rate = _parse_bytes(self.rate)
             if rate:
                 if rate < self.chunk_size:
                     self.chunk_size = rate
+                self.chunk_auto = False
                 self.rate = rate
                 self.receive = self._receive_rate
+                # rate limiting only applies to single connections
+                # and data read by Python itself
+                self.connections = 1
+                self.splice = False
             else:
                 self.log.warning("Invalid rate limit (%r)", self.rate)
         if self.progress is not None:
@@ -81,7 +113,7 @@ class HttpDownloader(DownloaderBase):
         try:
             return self._download_impl(url, pathfmt)
         except Exception:
-            print()
+            self.out.progress_newline()
             raise
         finally:
             # remove file from incomplete downloads
@@ -96,47 +128,71 @@ class HttpDownloader(DownloaderBase):
         kwdict = pathfmt.kwdict
         adjust_extension = kwdict.get(
             "_http_adjust_extension", self.adjust_extension)
+        method = kwdict.get("_http_method", "GET")
+        data = kwdict.get("_http_data")
+        validate = kwdict.get("_http_validate")
+        request = self.session.request
+        timeout = self.timeout
+        proxies = self.proxies
+        verify = self.verify
+        ranges = True
+
+        # collect HTTP headers
+        extra = kwdict.get("_http_headers")
+        if extra:
+            #   file-specific headers
+            base_headers = {"Accept": "*/*"}
+            base_headers.update(extra)
+            #   general headers
+            if self.headers:
+                base_headers.update(self.headers)
+        else:
+            base_headers = self._headers
 
         if self.part:
             pathfmt.part_enable(self.partdir)
 
         while True:
             if tries:
-                if response:
+                retry_after = 0
+                if response is not None:
+                    if response.status_code == 429:
+                        retry_after = text.parse_int(
+                            response.headers.get("Retry-After"))
                     response.close()
                     response = None
                 self.log.warning("%s (%s/%s)", msg, tries, self.retries+1)
                 if tries > self.retries:
                     return False
-                time.sleep(tries)
+                # capped exponential backoff with jitter
+                delay = min(60, 2 ** (tries-1)) * (0.5 + random.random())
+                if retry_after > delay:
+                    delay = min(60, retry_after)
+                    self.log.debug("Waiting %s seconds (Retry-After: %s)",
+                                   delay, retry_after)
+                time.sleep(delay)
 
             tries += 1
             file_header = None
 
-            # collect HTTP headers
-            headers = {"Accept": "*/*"}
-            #   file-specific headers
-            extra = kwdict.get("_http_headers")
-            if extra:
-                headers.update(extra)
-            #   general headers
-            if self.headers:
-                headers.update(self.headers)
             #   partial content
             file_size = pathfmt.part_size()
-            if file_size:
+            if file_size and ranges:
+                headers = base_headers.copy()
                 headers["Range"] = "bytes={}-".format(file_size)
+            else:
+                headers = base_headers
 
             # connect to (remote) source
             try:
-                response = self.session.request(
-                    kwdict.get("_http_method", "GET"), url,
+                response = request(
+                    method, url,
                     stream=True,
                     headers=headers,
-                    data=kwdict.get("_http_data"),
-                    timeout=self.timeout,
-                    proxies=self.proxies,
-                    verify=self.verify,
+                    data=data,
+                    timeout=timeout,
+                    proxies=proxies,
+                    verify=verify,
                 )
             except (ConnectionError, Timeout) as exc:
                 msg = str(exc)
@@ -163,7 +219,6 @@ class HttpDownloader(DownloaderBase):
                 return False
 
             # check for invalid responses
-            validate = kwdict.get("_http_validate")
             if validate:
                 result = validate(response)
                 if isinstance(result, str):
@@ -189,38 +244,59 @@ class HttpDownloader(DownloaderBase):
                     return False
 
             # set missing filename extension from MIME type
+            path_changed = False
             if not pathfmt.extension:
                 pathfmt.set_extension(self._find_extension(response))
-                if pathfmt.exists():
-                    pathfmt.temppath = ""
-                    return True
+                path_changed = True
 
             # set metadata from HTTP headers
             if self.metadata:
                 kwdict[self.metadata] = self._extract_metadata(response)
                 pathfmt.build_path()
-                if pathfmt.exists():
-                    pathfmt.temppath = ""
-                    return True
+                path_changed = True
 
-            content = response.iter_content(self.chunk_size)
+            # check the final path only once
+            if path_changed and pathfmt.exists():
+                pathfmt.temppath = ""
+                return True
+
+            # select chunk size based on file size
+            if self.chunk_auto and size:
+                chunk_size = min(1048576, max(32768, size // 64))
+            else:
+                chunk_size = self.chunk_size
+            content = self._iter_content(response, chunk_size)
 
             # check filename extension against file header
             if adjust_extension and not offset and \
                     pathfmt.extension in SIGNATURE_CHECKS:
                 try:
-                    file_header = next(
-                        content if response.raw.chunked
-                        else response.iter_content(16), b"")
-                except (RequestException, SSLError, OpenSSLError) as exc:
+                    file_header = next(content, b"")
+                except (RequestException, Urllib3Error,
+                        SSLError, OpenSSLError) as exc:
                     msg = str(exc)
-                    print()
+                    self.out.progress_newline()
                     continue
                 if self._adjust_extension(pathfmt, file_header) and \
                         pathfmt.exists():
                     pathfmt.temppath = ""
                     return True
 
+            # check whether to split the download across multiple connections
+            connections = 1
+            if self.connections > 1 and ranges and code == 200 and size and \
+                    method == "GET" and response.headers.get(
+                        "Accept-Ranges") == "bytes" and response.headers.get(
+                        "Content-Encoding", "identity") == "identity":
+                remaining = size - len(file_header or b"")
+                connections = max(1, min(
+                    self.connections, remaining // PART_SIZE_MIN))
+
+            # check whether to move data with os.splice()
+            sock = None
+            if self.splice and connections == 1:
+                sock = self._splice_socket(response)
+
             # set open mode
             if not offset:
                 mode = "w+b"
@@ -232,7 +308,7 @@ class HttpDownloader(DownloaderBase):
 
             # download content
             self.downloading = True
-            with pathfmt.open(mode) as fp:
+            with pathfmt.open(mode, self.buffer_size) as fp:
                 if file_header:
                     fp.write(file_header)
                     offset += len(file_header)
@@ -244,17 +320,35 @@ class HttpDownloader(DownloaderBase):
 
                 self.out.start(pathfmt.path)
                 try:
-                    self.receive(fp, content, size, offset)
-                except (RequestException, SSLError, OpenSSLError) as exc:
+                    if connections > 1:
+                        self._receive_parts(
+                            fp, response, content, url, headers,
+                            size, offset, connections, chunk_size)
+                    elif sock:
+                        self._receive_splice(
+                            fp, response, sock, size, offset, chunk_size)
+                    else:
+                        self.receive(fp, content, size, offset)
+                except (RequestException, Urllib3Error,
+                        SSLError, OpenSSLError) as exc:
                     msg = str(exc)
-                    print()
+                    self.out.progress_newline()
+                    if connections > 1 and isinstance(exc, HTTPError):
+                        status = exc.response.status_code
+                        if status != 429 and status < 500:
+                            # ranged requests are not supported after all;
+                            # restart with a single connection
+                            self.log.debug("Disabling split download (%s)",
+                                           msg)
+                            ranges = False
+                            tries -= 1
                     continue
 
                 # check file size
                 if size and fp.tell() < size:
                     msg = "file size mismatch ({} < {})".format(
                         fp.tell(), size)
-                    print()
+                    self.out.progress_newline()
                     continue
 
             break
@@ -267,23 +361,53 @@ class HttpDownloader(DownloaderBase):
 
         return True
 
+    def _iter_content(self, response, chunk_size=None):
+        """Yield decoded chunks of data read directly from 'response.raw'"""
+        raw = response.raw
+        read = raw.read
+        if not chunk_size:
+            chunk_size = self.chunk_size
+
+        while True:
+            data = read(chunk_size, decode_content=True)
+            if data:
+                yield data
+            elif raw.closed:
+                return
+
     @staticmethod
     def receive(fp, content, bytes_total, bytes_downloaded):
-        write = fp.write
-        for data in content:
-            write(data)
+        # let the file object iterate over 'content' in C
+        fp.writelines(content)
 
     def _receive_rate(self, fp, content, bytes_total, bytes_downloaded):
         rate = self.rate
         progress = self.progress
         bytes_start = bytes_downloaded
         write = fp.write
-        t1 = tstart = time.time()
+        monotonic = time.monotonic
+        t1 = tstart = monotonic()
+
+        if not rate:
+            # progress indicator only;
+            # check the current time only every 8 chunks
+            for num, data in enumerate(content, 1):
+                write(data)
+                bytes_downloaded += len(data)
+
+                if not num & 7:
+                    tdiff = monotonic() - tstart
+                    if tdiff >= progress:
+                        self.out.progress(
+                            bytes_total, bytes_downloaded,
+                            int((bytes_downloaded - bytes_start) / tdiff),
+                        )
+            return
 
         for data in content:
             write(data)
 
-            t2 = time.time()           # current time
+            t2 = monotonic()           # current time
             elapsed = t2 - t1          # elapsed time
             num_bytes = len(data)
 
@@ -296,45 +420,276 @@ class HttpDownloader(DownloaderBase):
                         int((bytes_downloaded - bytes_start) / tdiff),
                     )
 
-            if rate:
-                expected = num_bytes / rate  # expected elapsed time
-                if elapsed < expected:
-                    # sleep if less time elapsed than expected
-                    time.sleep(expected - elapsed)
-                    t2 = time.time()
+            expected = num_bytes / rate  # expected elapsed time
+            if elapsed < expected:
+                # sleep if less time elapsed than expected
+                time.sleep(expected - elapsed)
+                t2 = monotonic()
 
             t1 = t2
 
+    def _receive_parts(self, fp, response, content, url, headers,
+                       bytes_total, bytes_downloaded, num, chunk_size):
+        """Download the remaining data of 'url' over 'num' connections
+
+        The first part continues reading from 'response' into 'fp',
+        all others get requested with their own 'Range' header
+        and are stored in temporary files until they can be appended.
+        This way 'fp' only ever contains contiguous data
+        and remains resumable even after a hard crash.
+        """
+        # only split what is not already in 'fp'
+        step = (bytes_total - bytes_downloaded) // num
+        starts = [bytes_downloaded + step * index for index in range(num)]
+        ends = starts[1:] + [bytes_total]
+        received = [0] * num
+        stop = threading.Event()
+        directory = os.path.dirname(fp.name)
+        files = [fp]
+
+        def receive(index):
+            start = starts[index]
+            end = ends[index]
+
+            if index:
+                part_headers = headers.copy()
+                part_headers["Range"] = "bytes={}-{}".format(start, end-1)
+                part_response = self.session.request(
+                    "GET", url,
+                    stream=True,
+                    headers=part_headers,
+                    timeout=self.timeout,
+                    proxies=self.proxies,
+                    verify=self.verify,
+                )
+                if part_response.status_code != 206:
+                    part_response.close()
+                    raise HTTPError("'{} {}' for range {}-{}".format(
+                        part_response.status_code, part_response.reason,
+                        start, end-1), response=part_response)
+                part_content = self._iter_content(
+                    part_response, chunk_size)
+            else:
+                part_response = response
+                part_content = content
+
+            try:
+                remaining = end - start
+                write = files[index].write
+                for data in part_content:
+                    if stop.is_set():
+                        return
+                    if len(data) >= remaining:
+                        write(data[:remaining])
+                        received[index] += remaining
+                        return
+                    write(data)
+                    received[index] += len(data)
+                    remaining -= len(data)
+            finally:
+                part_response.close()
+
+        progress = self.progress
+        timeout = None if progress is None else 1.0
+
+        try:
+            for _ in range(1, num):
+                files.append(tempfile.TemporaryFile(
+                    dir=directory, buffering=self.buffer_size))
+
+            with concurrent.futures.ThreadPoolExecutor(num) as executor:
+                try:
+                    pending = [executor.submit(receive, index)
+                               for index in range(num)]
+                    tstart = time.monotonic()
+                    while pending:
+                        done, pending = concurrent.futures.wait(
+                            pending, timeout,
+                            concurrent.futures.FIRST_EXCEPTION)
+                        for future in done:
+                            future.result()
+
+                        if progress is not None:
+                            tdiff = time.monotonic() - tstart
+                            if tdiff >= progress:
+                                total = sum(received)
+                                self.out.progress(
+                                    bytes_total, bytes_downloaded + total,
+                                    int(total / tdiff),
+                                )
+                finally:
+                    stop.set()
+        finally:
+            # append all parts up to the first incomplete one
+            # so that a retry is able to resume from there
+            try:
+                for index in range(1, len(files)):
+                    if received[index-1] < ends[index-1] - starts[index-1]:
+                        break
+                    part = files[index]
+                    part.seek(0)
+                    shutil.copyfileobj(part, fp, self.buffer_size)
+            finally:
+                for part in files[1:]:
+                    part.close()
+
+    @staticmethod
+    def _splice_socket(response):
+        """Return the plain TCP socket of an unencoded 'response'"""
+        if response.headers.get(
+                "Content-Encoding", "identity") != "identity":
+            return None
+        try:
+            http_response = response.raw._fp
+            sock = http_response.fp.raw._sock
+        except AttributeError:
+            return None
+        if http_response.chunked or http_response.length is None:
+            return None
+        # TLS or other wrapped sockets are not supported
+        return sock if type(sock) is socket.socket else None
+
+    def _receive_splice(self, fp, response, sock,
+                        bytes_total, bytes_downloaded, chunk_size):
+        """Move the remaining data from 'sock' to 'fp' inside the kernel"""
+        http_response = response.raw._fp
+        remaining = http_response.length
+        progress = self.progress
+        position = bytes_downloaded
+        flags = os.SPLICE_F_MOVE
+        fallback = False
+
+        try:
+            # data already buffered by http.client
+            if remaining:
+                try:
+                    data = http_response.fp.read1(remaining)
+                except socket.timeout as exc:
+                    raise ReadTimeout(exc)
+                except OSError as exc:
+                    raise ConnectionError(exc)
+                fp.write(data)
+                position += len(data)
+                remaining -= len(data)
+            fp.flush()
+
+            sock_fd = sock.fileno()
+            file_fd = fp.fileno()
+            timeout = sock.gettimeout()
+            pipe_read, pipe_write = os.pipe()
+            tstart = time.monotonic()
+
+            try:
+                while remaining:
+                    count = min(remaining, chunk_size)
+                    try:
+                        if fallback:
+                            data = os.read(sock_fd, count)
+                            num = len(data)
+                        else:
+                            num = os.splice(
+                                sock_fd, pipe_write, count, flags=flags)
+                    except BlockingIOError:
+                        if not select.select(
+                                (sock_fd,), (), (), timeout)[0]:
+                            raise ReadTimeout("Read timed out")
+                        continue
+                    except OSError as exc:
+                        if fallback or exc.errno not in SPLICE_UNSUPPORTED:
+                            raise ConnectionError(exc)
+                        # continue with regular reads and writes
+                        self._disable_splice(exc)
+                        fallback = True
+                        fp.seek(position)
+                        continue
+                    if not num:
+                        break
+                    remaining -= num
+
+                    if fallback:
+                        fp.write(data)
+                        position += num
+                    else:
+                        while num:
+                            try:
+                                moved = os.splice(
+                                    pipe_read, file_fd, num,
+                                    offset_dst=position, flags=flags)
+                            except OSError as exc:
+                                if exc.errno not in SPLICE_UNSUPPORTED:
+                                    raise
+                                self._disable_splice(exc)
+                                fallback = True
+                                fp.seek(position)
+                                break
+                            position += moved
+                            num -= moved
+                        # write data left in the pipe
+                        while num:
+                            data = os.read(pipe_read, num)
+                            fp.write(data)
+                            position += len(data)
+                            num -= len(data)
+
+                    if progress is not None:
+                        tdiff = time.monotonic() - tstart
+                        if tdiff >= progress:
+                            self.out.progress(
+                                bytes_total, position,
+                                int((position - bytes_downloaded) / tdiff),
+                            )
+            finally:
+                os.close(pipe_read)
+                os.close(pipe_write)
+        finally:
+            # http.client's state is no longer valid
+            response.close()
+            fp.seek(position)
+
+    def _disable_splice(self, exc):
+        self.log.warning("Disabling 'splice' (%s)", exc)
+        self.splice = False
+
     def _extract_metadata(self, response):
         headers = response.headers
         data = dict(headers)
+        get = headers.get
 
-        hcd = headers.get("content-disposition")
+        hcd = get("content-disposition")
         if hcd:
             name = text.extr(hcd, 'filename="', '"')
             if name:
                 text.nameext_from_url(name, data)
 
-        hlm = headers.get("last-modified")
+        hlm = get("last-modified")
         if hlm:
-            data["date"] = datetime(*parsedate_tz(hlm)[:6])
+            try:
+                date = parsedate_to_datetime(hlm)
+            except (TypeError, ValueError):
+                pass
+            else:
+                if date.tzinfo:
+                    # naive UTC datetime like all other 'date' values
+                    date = date.replace(tzinfo=None) - date.utcoffset()
+                data["date"] = date
 
         return data
 
     def _find_extension(self, response):
         """Get filename extension from MIME type"""
         mtype = response.headers.get("Content-Type", "image/jpeg")
-        mtype = mtype.partition(";")[0]
+        mtype = mtype.partition(";")[0].strip().lower()
 
         if "/" not in mtype:
             mtype = "image/" + mtype
 
-        if mtype in MIME_TYPES:
-            return MIME_TYPES[mtype]
+        if mtype in MIME_CACHE:
+            return MIME_CACHE[mtype]
 
         ext = mimetypes.guess_extension(mtype, strict=False)
         if ext:
-            return ext[1:]
+            ext = MIME_CACHE[mtype] = ext[1:]
+            return ext
 
         self.log.warning("Unknown MIME type '%s'", mtype)
         return "bin"
@@ -343,13 +698,27 @@ class HttpDownloader(DownloaderBase):
     def _adjust_extension(pathfmt, file_header):
         """Check filename extension against file header"""
         if not SIGNATURE_CHECKS[pathfmt.extension](file_header):
-            for ext, check in SIGNATURE_CHECKS.items():
+            for ext, check in SIGNATURE_INDEX.get(
+                    file_header[:1], SIGNATURE_INDEX[None]):
                 if check(file_header):
                     pathfmt.set_extension(ext)
                     return True
         return False
 
 
+def _parse_bytes(value):
+    """Cached text.parse_bytes() for config values"""
+    try:
+        return _bytes_cache[value]
+    except KeyError:
+        result = _bytes_cache[value] = text.parse_bytes(value)
+        return result
+    except TypeError:  # unhashable
+        return text.parse_bytes(value)
+
+
+_bytes_cache = {}
+
 MIME_TYPES = {
     "image/jpeg"    : "jpg",
     "image/jpg"     : "jpg",
@@ -395,32 +764,70 @@ MIME_TYPES = {
     "application/octet-stream": "bin",
 }
 
+# MIME_TYPES and all other types resolved by 'mimetypes' so far
+MIME_CACHE = MIME_TYPES.copy()
+
+# os.splice() errors caused by unsupported file or socket types
+SPLICE_UNSUPPORTED = (errno.EINVAL, errno.EOPNOTSUPP, errno.ENOSYS)
+
+# minimum number of bytes per connection of a split download
+PART_SIZE_MIN = 1048576
+
 # https://en.wikipedia.org/wiki/List_of_file_signatures
 SIGNATURE_CHECKS = {
-    "jpg" : lambda s: s[0:3] == b"\xFF\xD8\xFF",
-    "png" : lambda s: s[0:8] == b"\x89PNG\r\n\x1A\n",
-    "gif" : lambda s: s[0:6] in (b"GIF87a", b"GIF89a"),
-    "bmp" : lambda s: s[0:2] == b"BM",
-    "webp": lambda s: (s[0:4] == b"RIFF" and
-                       s[8:12] == b"WEBP"),
-    "avif": lambda s: s[4:12] == b"ftypavif",
-    "svg" : lambda s: s[0:5] == b"<?xml",
-    "ico" : lambda s: s[0:4] == b"\x00\x00\x01\x00",
-    "cur" : lambda s: s[0:4] == b"\x00\x00\x02\x00",
-    "psd" : lambda s: s[0:4] == b"8BPS",
-    "webm": lambda s: s[0:4] == b"\x1A\x45\xDF\xA3",
-    "ogg" : lambda s: s[0:4] == b"OggS",
-    "wav" : lambda s: (s[0:4] == b"RIFF" and
-                       s[8:12] == b"WAVE"),
-    "mp3" : lambda s: (s[0:3] == b"ID3" or
-                       s[0:2] in (b"\xFF\xFB", b"\xFF\xF3", b"\xFF\xF2")),
-    "zip" : lambda s: s[0:4] in (b"PK\x03\x04", b"PK\x05\x06", b"PK\x07\x08"),
-    "rar" : lambda s: s[0:6] == b"\x52\x61\x72\x21\x1A\x07",
-    "7z"  : lambda s: s[0:6] == b"\x37\x7A\xBC\xAF\x27\x1C",
-    "pdf" : lambda s: s[0:5] == b"%PDF-",
-    "swf" : lambda s: s[0:3] in (b"CWS", b"FWS"),
+    "jpg" : lambda s: s.startswith(b"\xFF\xD8\xFF"),
+    "png" : lambda s: s.startswith(b"\x89PNG\r\n\x1A\n"),
+    "gif" : lambda s: s.startswith((b"GIF87a", b"GIF89a")),
+    "bmp" : lambda s: s.startswith(b"BM"),
+    "webp": lambda s: (s.startswith(b"RIFF") and
+                       s.startswith(b"WEBP", 8)),
+    "avif": lambda s: s.startswith(b"ftypavif", 4),
+    "svg" : lambda s: s.startswith(b"<?xml"),
+    "ico" : lambda s: s.startswith(b"\x00\x00\x01\x00"),
+    "cur" : lambda s: s.startswith(b"\x00\x00\x02\x00"),
+    "psd" : lambda s: s.startswith(b"8BPS"),
+    "webm": lambda s: s.startswith(b"\x1A\x45\xDF\xA3"),
+    "ogg" : lambda s: s.startswith(b"OggS"),
+    "wav" : lambda s: (s.startswith(b"RIFF") and
+                       s.startswith(b"WAVE", 8)),
+    "mp3" : lambda s: s.startswith(
+        (b"ID3", b"\xFF\xFB", b"\xFF\xF3", b"\xFF\xF2")),
+    "zip" : lambda s: s.startswith(
+        (b"PK\x03\x04", b"PK\x05\x06", b"PK\x07\x08")),
+    "rar" : lambda s: s.startswith(b"\x52\x61\x72\x21\x1A\x07"),
+    "7z"  : lambda s: s.startswith(b"\x37\x7A\xBC\xAF\x27\x1C"),
+    "pdf" : lambda s: s.startswith(b"%PDF-"),
+    "swf" : lambda s: s.startswith((b"CWS", b"FWS")),
     # check 'bin' files against all other file signatures
     "bin" : lambda s: False,
 }
 
+# candidate extensions for each possible first byte of a file header,
+# 'None' for all other bytes
+# ('avif' headers start with a variable box size, usually 0x00)
+SIGNATURE_INDEX = {
+    None   : ("avif",),
+    b"\xFF": ("jpg", "mp3"),
+    b"\x89": ("png",),
+    b"G"   : ("gif",),
+    b"B"   : ("bmp",),
+    b"R"   : ("webp", "wav", "rar"),
+    b"<"   : ("svg",),
+    b"\x00": ("ico", "cur", "avif"),
+    b"8"   : ("psd",),
+    b"\x1A": ("webm",),
+    b"O"   : ("ogg",),
+    b"I"   : ("mp3",),
+    b"P"   : ("zip",),
+    b"7"   : ("7z",),
+    b"%"   : ("pdf",),
+    b"C"   : ("swf",),
+    b"F"   : ("swf",),
+}
+# resolve each candidate's check function in advance
+SIGNATURE_INDEX = {
+    byte: tuple((ext, SIGNATURE_CHECKS[ext]) for ext in exts)
+    for byte, exts in SIGNATURE_INDEX.items()
+}
+
 __downloader__ = HttpDownloader
@@ -291,6 +291,9 @@ class NullOutput():
     def progress(self, bytes_total, bytes_downloaded, bytes_per_second):
         """Display download progress"""
 
+    def progress_newline(self):
+        """End the line of an interrupted download"""
+
 
 class PipeOutput(NullOutput):
 
@@ -331,6 +334,9 @@ class TerminalOutput():
             stderr_write("\r{:>3}% {:>7}B {:>7}B/s ".format(
                 bytes_downloaded * 100 // bytes_total, bdl, bps))
 
+    def progress_newline(self):
+        stdout_write("\n")
+
 
 class ColorOutput(TerminalOutput):
 
@@ -414,6 +420,9 @@ class CustomOutput():
                 bdl, bps, util.format_value(bytes_total),
                 bytes_downloaded * 100 // bytes_total))
 
+    def progress_newline(self):
+        stdout_write("\n")
+
 
 class EAWCache(dict):
 
@@ -139,13 +139,13 @@ class PathFormat():
                 re.compile("[" + chars + "]").sub, repl)
         return func
 
-    def open(self, mode="wb"):
+    def open(self, mode="wb", buffering=-1):
         """Open file and return a corresponding file object"""
         try:
-            return open(self.temppath, mode)
+            return open(self.temppath, mode, buffering)
         except FileNotFoundError:
             os.makedirs(self.realdirectory)
-            return open(self.temppath, mode)
+            return open(self.temppath, mode, buffering)
 
     def exists(self):
         """Return True if the file exists on disk"""
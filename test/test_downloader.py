@@ -13,17 +13,24 @@ import unittest
 from unittest.mock import Mock, MagicMock, patch
 
 import re
+import errno
+import socket
+import struct
 import logging
+import datetime
 import os.path
 import binascii
 import tempfile
 import threading
 import http.server
+import socketserver
+from requests.structures import CaseInsensitiveDict
 
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from gallery_dl import downloader, extractor, output, config, path  # noqa E402
-from gallery_dl.downloader.http import MIME_TYPES, SIGNATURE_CHECKS # noqa E402
+from gallery_dl.downloader.http import (  # noqa E402
+    MIME_TYPES, MIME_CACHE, SIGNATURE_CHECKS)
 
 
 class MockDownloaderModule(Mock):
@@ -173,7 +180,7 @@ class TestHTTPDownloader(TestDownloaderBase):
 
         port = 8088
         cls.address = "http://127.0.0.1:{}".format(port)
-        server = http.server.HTTPServer(("", port), HttpRequestHandler)
+        server = ThreadingHTTPServer(("", port), HttpRequestHandler)
         threading.Thread(target=server.serve_forever, daemon=True).start()
 
     def _run_test(self, ext, input, output,
@@ -184,6 +191,10 @@ class TestHTTPDownloader(TestDownloaderBase):
 
     def tearDown(self):
         self.downloader.minsize = self.downloader.maxsize = None
+        self.downloader.connections = 1
+        self.downloader.splice = False
+        self.downloader.chunk_auto = False
+        self.downloader.chunk_size = 32768
 
     def test_http_download(self):
         self._run_test("jpg", None, DATA["jpg"], "jpg", "jpg")
@@ -221,6 +232,202 @@ class TestHTTPDownloader(TestDownloaderBase):
             success = self.downloader.download(url, pathfmt)
         self.assertFalse(success)
 
+    def test_http_find_extension(self):
+        response = Mock()
+        find = self.downloader._find_extension
+
+        response.headers = {"Content-Type": "IMAGE/PNG; charset=utf-8"}
+        self.assertEqual(find(response), "png")
+        response.headers = {"Content-Type": "gif"}
+        self.assertEqual(find(response), "gif")
+        response.headers = {}
+        self.assertEqual(find(response), "jpg")
+
+        # unknown types are looked up once and then served from MIME_CACHE
+        mtype = "text/x-gallery-dl-test"
+        response.headers = {"Content-Type": mtype}
+        with patch("mimetypes.guess_extension",
+                   return_value=".test") as guess:
+            try:
+                self.assertEqual(find(response), "test")
+                self.assertEqual(find(response), "test")
+                self.assertEqual(MIME_CACHE[mtype], "test")
+            finally:
+                MIME_CACHE.pop(mtype, None)
+        guess.assert_called_once_with(mtype, strict=False)
+
+    @patch("random.random", return_value=0.5)
+    @patch("time.sleep")
+    def test_http_retry_after(self, sleep, random):
+        HttpRequestHandler.retry_after = ["3", None, "86400"]
+        with patch.object(self.downloader, "retries", 3), \
+                self.assertLogs(self.downloader.log, "DEBUG") as log_info:
+            TestDownloaderBase._run_test(
+                self, self.address + "/ratelimit", None, DATA_LARGE,
+                "bin", "bin")
+
+        # exponential backoff, raised to a 'Retry-After' of at most 60s
+        self.assertEqual(
+            [call[0][0] for call in sleep.call_args_list], [3, 2.0, 60])
+        self.assertIn(
+            "Waiting 60 seconds (Retry-After: 86400)",
+            [record.getMessage() for record in log_info.records])
+
+    def test_http_extract_metadata(self):
+        response = Mock()
+        response.headers = CaseInsensitiveDict({
+            "Content-Disposition": 'attachment; filename="foo.png"',
+            "Last-Modified": "Wed, 21 Oct 2015 07:28:00 +0200",
+        })
+        data = self.downloader._extract_metadata(response)
+
+        self.assertEqual(data["filename"], "foo")
+        self.assertEqual(data["extension"], "png")
+        self.assertEqual(data["date"], datetime.datetime(2015, 10, 21, 5, 28))
+        self.assertEqual(data["Last-Modified"],
+                         "Wed, 21 Oct 2015 07:28:00 +0200")
+
+        response.headers["Last-Modified"] = "invalid"
+        data = self.downloader._extract_metadata(response)
+        self.assertNotIn("date", data)
+
+    def test_http_chunk_auto(self):
+        self.downloader.chunk_auto = True
+        TestDownloaderBase._run_test(
+            self, self.address + "/large", None, DATA_LARGE, "bin", "bin")
+        self._run_test("gif", None, DATA["gif"], "jpg", "gif")
+
+    def test_http_chunk_auto_connections(self):
+        self.downloader.chunk_auto = True
+        self.downloader.connections = 3
+        sizes = []
+        iter_content = self.downloader._iter_content
+
+        def _iter_content(response, chunk_size=None):
+            sizes.append(chunk_size)
+            return iter_content(response, chunk_size)
+
+        with patch.object(self.downloader, "_iter_content", _iter_content):
+            TestDownloaderBase._run_test(
+                self, self.address + "/large", None, DATA_LARGE, "bin", "bin")
+
+        # every part uses the size selected for DATA_LARGE
+        self.assertEqual(sizes, [len(DATA_LARGE) // 64] * 3)
+
+    def test_http_connections(self):
+        self.downloader.connections = 3
+        HttpRequestHandler.ranges = ranges = []
+        TestDownloaderBase._run_test(
+            self, self.address + "/large", None, DATA_LARGE, "bin", "bin")
+
+        # the first part starts after the 32 KiB file header
+        self.assertEqual(sorted(ranges, key=str), [
+            None,
+            "bytes=1419946-2807123",
+            "bytes=2807124-4194303",
+        ])
+
+    def test_http_connections_header(self):
+        # first chunk (file header) larger than PART_SIZE_MIN
+        self.downloader.connections = 3
+        self.downloader.chunk_size = 4194304
+        HttpRequestHandler.ranges = ranges = []
+        TestDownloaderBase._run_test(
+            self, self.address + "/large", None, DATA_LARGE, "bin", "bin")
+        self.assertEqual(ranges, [None])
+
+        # split only the data after the file header
+        self.downloader.chunk_size = 1835008
+        HttpRequestHandler.ranges = ranges = []
+        with patch("gallery_dl.downloader.http.PART_SIZE_MIN", 262144):
+            TestDownloaderBase._run_test(
+                self, self.address + "/large", None, DATA_LARGE, "bin", "bin")
+        self.assertEqual(sorted(ranges, key=str), [
+            None,
+            "bytes=2621440-3407871",
+            "bytes=3407872-4194303",
+        ])
+
+    def test_http_connections_resume(self):
+        self.downloader.connections = 3
+        HttpRequestHandler.ranges = ranges = []
+        HttpRequestHandler.errors = {"bytes=1419946-2807123"}
+        TestDownloaderBase._run_test(
+            self, self.address + "/large", None, DATA_LARGE, "bin", "bin")
+
+        # the retry resumes within the first part,
+        # since nothing after the failed second one was kept
+        match = re.fullmatch(r"bytes=(\d+)-", ranges[-1])
+        self.assertTrue(match)
+        self.assertLessEqual(int(match.group(1)), 1419946)
+
+    def test_http_connections_unsupported(self):
+        self.downloader.connections = 3
+
+        # 'Range' ignored: parts get '200 OK'
+        HttpRequestHandler.ranges = ranges = []
+        TestDownloaderBase._run_test(
+            self, self.address + "/norange", None, DATA_LARGE, "bin", "bin")
+        self.assertEqual(len(ranges), 4)
+        self.assertEqual(ranges[-1], None)
+
+        # 'Range' rejected: parts get '403 Forbidden'
+        HttpRequestHandler.ranges = ranges = []
+        TestDownloaderBase._run_test(
+            self, self.address + "/forbidden", None, DATA_LARGE, "bin", "bin")
+        self.assertEqual(len(ranges), 4)
+        self.assertEqual(ranges[-1], None)
+
+    @unittest.skipIf(not hasattr(os, "splice"), "no os.splice()")
+    def test_http_splice(self):
+        self.downloader.splice = True
+        TestDownloaderBase._run_test(
+            self, self.address + "/large", None, DATA_LARGE, "bin", "bin")
+        self._run_test("jpg", DATA["jpg"][:123], DATA["jpg"], "jpg", "jpg")
+
+        # files too small to split still use os.splice()
+        self.downloader.connections = 3
+        with patch.object(self.downloader, "_receive_splice",
+                          wraps=self.downloader._receive_splice) as splice, \
+                patch.object(self.downloader, "adjust_extension", False):
+            self._run_test("jpg", None, DATA["jpg"], "jpg", "jpg")
+        self.assertEqual(splice.call_count, 1)
+
+    @unittest.skipIf(not hasattr(os, "splice"), "no os.splice()")
+    def test_http_splice_reset(self):
+        url = self.address + "/reset"
+        pathfmt = self._prepare_destination(None, extension="bin")
+        self.downloader.splice = True
+        self.downloader.retries = 0
+        try:
+            with self.assertLogs(self.downloader.log, "WARNING"):
+                success = self.downloader.download(url, pathfmt)
+        finally:
+            self.downloader.retries = self.job.extractor._retries
+        self.assertFalse(success)
+
+    @unittest.skipIf(not hasattr(os, "splice"), "no os.splice()")
+    def test_http_splice_unsupported(self):
+        splice = os.splice
+
+        def splice_file_einval(src, dst, count, offset_src=None,
+                               offset_dst=None, flags=0):
+            if offset_dst is not None:
+                raise OSError(errno.EINVAL, "Invalid argument")
+            return splice(src, dst, count, offset_src, offset_dst, flags)
+
+        def splice_einval(*args, **kwargs):
+            raise OSError(errno.EINVAL, "Invalid argument")
+
+        for func in (splice_file_einval, splice_einval):
+            self.downloader.splice = True
+            with patch("os.splice", func), \
+                    self.assertLogs(self.downloader.log, "WARNING"):
+                TestDownloaderBase._run_test(
+                    self, self.address + "/large", None,
+                    DATA_LARGE, "bin", "bin")
+            self.assertFalse(self.downloader.splice)
+
 
 class TestTextDownloader(TestDownloaderBase):
 
@@ -239,13 +446,43 @@ class TestTextDownloader(TestDownloaderBase):
         self._run_test("text:", None, "", "txt", "txt")
 
 
+class ThreadingHTTPServer(socketserver.ThreadingMixIn,
+                          http.server.HTTPServer):
+    daemon_threads = True
+
+
 class HttpRequestHandler(http.server.BaseHTTPRequestHandler):
+    ranges = []    # 'Range' headers of all requests
+    errors = ()    # 'Range' headers to answer once with '503'
+    retry_after = []  # 'Retry-After' values of '429' responses to /ratelimit
 
     def do_GET(self):
+        hrange = self.headers.get("Range")
+        self.ranges.append(hrange)
+        if hrange in self.errors:
+            HttpRequestHandler.errors = ()
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if self.path == "/ratelimit" and self.retry_after:
+            value = self.retry_after.pop(0)
+            self.send_response(429)
+            if value is not None:
+                self.send_header("Retry-After", value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
         if self.path.startswith("/image."):
             ext = self.path.rpartition(".")[2]
             content_type = MIME_TYPES.get(ext)
             output = DATA[ext]
+        elif self.path in ("/large", "/reset", "/norange", "/forbidden",
+                           "/ratelimit"):
+            content_type = "application/octet-stream"
+            output = DATA_LARGE
         else:
             self.send_response(404)
             self.wfile.write(self.path.encode())
@@ -254,17 +491,26 @@ class HttpRequestHandler(http.server.BaseHTTPRequestHandler):
         headers = {
             "Content-Type": content_type,
             "Content-Length": len(output),
+            "Accept-Ranges": "bytes",
         }
 
-        if "Range" in self.headers:
+        if hrange and self.path == "/forbidden":
+            self.send_response(403)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if hrange and self.path != "/norange":
             status = 206
 
-            match = re.match(r"bytes=(\d+)-", self.headers["Range"])
+            match = re.match(r"bytes=(\d+)-(\d*)", hrange)
             start = int(match.group(1))
+            end = int(match.group(2) or len(output)-1)
 
             headers["Content-Range"] = "bytes {}-{}/{}".format(
-                start, len(output)-1, len(output))
-            output = output[start:]
+                start, end, len(output))
+            output = output[start:end+1]
+            headers["Content-Length"] = len(output)
         else:
             status = 200
 
@@ -272,6 +518,15 @@ class HttpRequestHandler(http.server.BaseHTTPRequestHandler):
         for key, value in headers.items():
             self.send_header(key, value)
         self.end_headers()
+
+        if self.path == "/reset":
+            # send half of the data, then reset the connection
+            self.wfile.write(output[:len(output) // 2])
+            self.connection.setsockopt(
+                socket.SOL_SOCKET, socket.SO_LINGER,
+                struct.pack("ii", 1, 0))
+            self.connection.close()
+            return
         self.wfile.write(output)
 
 
@@ -306,6 +561,8 @@ DATA = {
     "swf" : b"CWS",
 }
 
+DATA_LARGE = bytes(range(256)) * 16384  # 4 MiB
+
 
 # reverse mime types mapping
 MIME_TYPES = {